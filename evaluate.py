@@ -24,7 +24,13 @@ def getSequenceName(curr_dir, feature_folder):
 		sys.exit(1)
 	
 	fasta_files = [f for f in files if f.endswith('.fasta')]
-	fasta_files = sorted(fasta_files)
+	# feature rows follow list.txt, so read the sequence files in the same order
+	list_file = os.path.join(curr_dir + feature_folder, "list.txt")
+	if os.path.isfile(list_file):
+		with open(list_file, "r") as lf:
+			fasta_files = [f for f in lf.read().split() if f.endswith('.fasta')]
+	else:
+		fasta_files = sorted(fasta_files)
 	seqIDs = []
 	
 	for file in fasta_files:
@@ -9,107 +9,468 @@ License: MIT
 
 import os
 import sys
+import array
+import asyncio
+import errno
+import hashlib
+import importlib.util
 import shutil
+import signal
 import subprocess
-import multiprocessing as mp
 from optparse import OptionParser
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
 import time
 from pathlib import Path
 
+# numba k-mer counter, bound by load_kmer_counts() once the sequence files are written
+kmer_counts = None
+
+try:
+    import liburing  # io_uring bindings for batched sequence file writes, used with -u
+except ImportError:
+    liburing = None
+
+GT = b">"
+NEWLINE = b"\n"
+WHITESPACE = b" \t\r\n"
+
+# Concurrent sequence file writers, and so the size of the writer pool; -j only sets the k-mer stage width
+WRITE_WORKERS = 4
+
+# Records handed to a writer task at a time
+WRITE_BATCH_SIZE = 256
+
+# Write buffer for list.txt and its shards
+LIST_BUFFER_SIZE = 1 << 20
+
+# Java sources of the feature collector, compiled on demand
+JAVA_SOURCES = ['ParallelKmersFeaturesCollector.java', 'BufferReaderAndWriter.java']
+
+# Files opened per io_uring submission; each file then takes a write and a close entry
+URING_BATCH = 32
+
+# FASTA size above which sequence files are written from a process pool instead of threads
+PROCESS_POOL_MIN_BYTES = 16 << 20
+
 def setup_directories(feature_destpath, kanalyzer_input_destpath, kanalyzer_output_destpath):
     """Setup required directories for parallel processing"""
     
     # Clean and create input directory
-    if os.path.isdir(kanalyzer_input_destpath):
-        shutil.rmtree(kanalyzer_input_destpath)
-    os.makedirs(kanalyzer_input_destpath)
+    shutil.rmtree(kanalyzer_input_destpath, ignore_errors=True)
+    os.makedirs(kanalyzer_input_destpath, exist_ok=True)
 
     # Clean and create output directory
-    if os.path.isdir(kanalyzer_output_destpath):
-        shutil.rmtree(kanalyzer_output_destpath)
-    os.makedirs(kanalyzer_output_destpath)
+    shutil.rmtree(kanalyzer_output_destpath, ignore_errors=True)
+    os.makedirs(kanalyzer_output_destpath, exist_ok=True)
     
     # Create k-mer specific directories
     for kmer_size in ['2mer', '3mer', '4mer']:
         kmer_dir = os.path.join(kanalyzer_output_destpath, kmer_size)
         os.makedirs(kmer_dir, exist_ok=True)
 
-def parallel_sequence_splitting(fasta_file, data_filepath, kanalyzer_input_destpath, max_workers=None):
-    """Split FASTA file into individual sequences using parallel processing"""
+def iter_fasta(fasta_path, chunk_size=1 << 20):
+    """Stream (header, sequence) byte pairs from a FASTA file, reading it in chunk_size blocks"""
+    
+    buf = bytearray()
+    started = False
+    scan = 0
+    with open(fasta_path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b''):
+            buf += chunk
+            if not started:
+                first = buf.find(b">")
+                if first < 0:
+                    buf.clear()
+                    continue
+                del buf[:first + 1]
+                started = True
+            
+            # Emit every record terminated by a "\n>" boundary, keep the partial tail
+            start = 0
+            while True:
+                end = buf.find(b"\n>", max(start, scan))
+                if end < 0:
+                    break
+                header, _, seq_data = bytes(buf[start:end + 1]).partition(b"\n")
+                if header.strip() or seq_data.strip():
+                    yield header, seq_data
+                start = end + 2
+            del buf[:start]
+            scan = max(0, len(buf) - 1)
+    
+    if started:
+        header, _, seq_data = bytes(buf).partition(b"\n")
+        if header.strip() or seq_data.strip():
+            yield header, seq_data
+
+def write_chunk(first_id, records, output_dir):
+    """Write a contiguous run of (header, sequence) records as seq{i}.fasta files, numbered from first_id"""
     
-    print(f"Reading and splitting FASTA file: {fasta_file}")
+    # Build file names by plain concatenation, os.path.join is measurable at this call rate
+    prefix = os.path.join(output_dir, "seq")
+    for seq_id, (header, seq_data) in enumerate(records, first_id):
+        with open(prefix + str(seq_id) + ".fasta", 'wb') as of:
+            of.write(GT + header + NEWLINE + seq_data)
+    
+    return len(records)
+
+def uring_reap(ring, cqe, count):
+    """Wait for count completions and return their (user_data, res) pairs"""
+    
+    results = []
+    while len(results) < count:
+        liburing.io_uring_wait_cqe(ring, cqe)
+        entry = cqe[0]
+        results.append((liburing.io_uring_cqe_get_data64(entry), entry.res))
+        liburing.io_uring_cqe_seen(ring, entry)
+    return results
+
+def write_chunk_uring(first_id, records, output_dir):
+    """write_chunk through io_uring: open, writev and close URING_BATCH files per submission"""
+    
+    prefix = os.path.join(output_dir, "seq")
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC
+    ring = liburing.Ring()
+    cqe = liburing.Cqe()
+    liburing.io_uring_queue_init(2 * URING_BATCH, ring)
+    try:
+        for start in range(0, len(records), URING_BATCH):
+            batch = records[start:start + URING_BATCH]
+            paths = [prefix + str(seq_id) + ".fasta" for seq_id in range(first_id + start, first_id + start + len(batch))]
+            
+            for i, path in enumerate(paths):
+                sqe = liburing.io_uring_get_sqe(ring)
+                liburing.io_uring_prep_open(sqe, path, flags, 0o666)
+                liburing.io_uring_sqe_set_data64(sqe, i)
+            liburing.io_uring_submit(ring)
+            fds = [-1] * len(batch)
+            for i, res in uring_reap(ring, cqe, len(batch)):
+                fds[i] = res
+            failed = [i for i, fd in enumerate(fds) if fd < 0]
+            if failed:
+                for fd in fds:
+                    if fd >= 0:
+                        os.close(fd)
+                raise OSError(-fds[failed[0]], os.strerror(-fds[failed[0]]), paths[failed[0]])
+            
+            # The close is hard-linked so it runs even when the write fails; the
+            # iovecs must stay referenced until their completions are reaped
+            iovecs = []
+            sizes = []
+            for i, (header, seq_data) in enumerate(batch):
+                iov = liburing.Iovec([GT, header, NEWLINE, seq_data])
+                iovecs.append(iov)
+                sizes.append(len(GT) + len(header) + len(NEWLINE) + len(seq_data))
+                sqe = liburing.io_uring_get_sqe(ring)
+                liburing.io_uring_prep_writev(sqe, fds[i], iov)
+                liburing.io_uring_sqe_set_flags(sqe, liburing.IOSQE_IO_HARDLINK)
+                liburing.io_uring_sqe_set_data64(sqe, i)
+                sqe = liburing.io_uring_get_sqe(ring)
+                liburing.io_uring_prep_close(sqe, fds[i])
+                liburing.io_uring_sqe_set_data64(sqe, URING_BATCH + i)
+            liburing.io_uring_submit(ring)
+            error = None
+            for tag, res in uring_reap(ring, cqe, 2 * len(batch)):
+                i = tag % URING_BATCH
+                if error is not None:
+                    continue
+                if res < 0:
+                    error = OSError(-res, os.strerror(-res), paths[i])
+                elif tag < URING_BATCH and res != sizes[i]:
+                    error = OSError(errno.EIO, "short write", paths[i])
+            if error is not None:
+                raise error
+    finally:
+        liburing.io_uring_queue_exit(ring)
     
-    with open(os.path.join(data_filepath, fasta_file), 'rt') as fp:
-        content = fp.read()
-        sequences = content.split(">")[1:]  # Skip empty first element
+    return len(records)
+
+def uring_available():
+    """True when liburing is installed and the kernel (or seccomp policy) lets us set up a ring"""
     
-    print(f"Found {len(sequences)} sequences to process")
+    if liburing is None:
+        return False
+    ring = liburing.Ring()
+    try:
+        liburing.io_uring_queue_init(1, ring)
+    except OSError:
+        return False
+    liburing.io_uring_queue_exit(ring)
+    return True
+
+def sequence_key(bases):
+    """Digest identifying a sequence by its bases (line breaks already removed), ignoring case"""
     
-    def write_sequence(args):
-        seq_data, seq_id, output_dir = args
-        output_file = os.path.join(output_dir, f"seq{seq_id}.fasta")
-        with open(output_file, 'w') as of:
-            of.write(">" + seq_data)
+    return hashlib.blake2b(bases.upper(), digest_size=16).digest()
+
+def gil_disabled():
+    """True on a free-threaded (PEP 703) interpreter running with the GIL disabled"""
     
-    # Use optimal number of workers for I/O operations
-    if max_workers is None:
-        max_workers = min(32, mp.cpu_count())  # Limit for I/O operations
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)  # Python 3.13+
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+def create_executor(fasta_path, max_workers):
+    """Create the worker pool that writes the sequence files"""
+    
+    # Without a GIL threads already run in parallel, and they skip pickling the FASTA records
+    if gil_disabled():
+        return ThreadPoolExecutor(max_workers=max(1, max_workers))
+    
+    # Large inputs are split across processes so that the per-file work is not serialized on the GIL.
+    # numba is not loaded yet (see load_kmer_counts), so the default start method is safe.
+    if os.path.getsize(fasta_path) > PROCESS_POOL_MIN_BYTES:
+        return ProcessPoolExecutor(max_workers=max(1, max_workers))
+    return ThreadPoolExecutor(max_workers=max(1, max_workers))
+
+def parallel_sequence_splitting(fasta_file, data_filepath, kanalyzer_input_destpath, max_workers=None,
+                                keep_sequences=False, find_duplicates=False, use_uring=False):
+    """Split FASTA file into individual sequences using parallel processing
+    
+    The FASTA file is streamed: parsed records are handed to the writer pool in batches
+    while the rest of the file is still being read. Returns the number of sequences, their
+    packed bases if keep_sequences is set, and, if find_duplicates is set, a
+    {seq_id: canonical_seq_id} map of repeated sequences.
     
-    # Prepare arguments for parallel processing
-    args_list = [(seq_data, i+1, kanalyzer_input_destpath) 
-                 for i, seq_data in enumerate(sequences) if seq_data.strip()]
+    The packed bases are a (bytearray, array of int64 offsets) pair: sequence i, line breaks
+    removed, is bases[offsets[i]:offsets[i + 1]]. With find_duplicates only canonical
+    sequences are packed.
+    With use_uring the files are written through batched io_uring submissions.
+    """
+    
+    print(f"Reading and splitting FASTA file: {fasta_file}")
     
-    # Write sequences in parallel
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        executor.map(write_sequence, args_list)
+    fasta_path = os.path.join(data_filepath, fasta_file)
     
-    return len(args_list)
+    # File creation serializes on the directory inode lock, so a few writers are enough
+    if max_workers is None:
+        max_workers = min(WRITE_WORKERS, os.cpu_count())
+    
+    writer = write_chunk_uring if use_uring else write_chunk
+    
+    # Bases are appended to one buffer as they are parsed rather than kept per record
+    sequences = (bytearray(), array.array('q', [0])) if keep_sequences else None
+    seen = {}
+    duplicates = {}
+    num_sequences = 0
+    batch = []
+    pending = set()
+    
+    # Write sequences in parallel. At most max_workers batches are in flight, one per writer,
+    # which bounds the queued records while the rest of the file is parsed.
+    with create_executor(fasta_path, max_workers) as executor:
+        for record in iter_fasta(fasta_path):
+            batch.append(record)
+            if keep_sequences or find_duplicates:
+                bases = record[1].translate(None, WHITESPACE)
+                is_duplicate = False
+                if find_duplicates:
+                    seq_id = num_sequences + len(batch)
+                    canonical_id = seen.setdefault(sequence_key(bases), seq_id)
+                    if canonical_id != seq_id:
+                        duplicates[seq_id] = canonical_id
+                        is_duplicate = True
+                if keep_sequences and not is_duplicate:
+                    sequences[0].extend(bases)
+                    sequences[1].append(len(sequences[0]))
+            if len(batch) == WRITE_BATCH_SIZE:
+                pending.add(executor.submit(writer, num_sequences + 1, batch,
+                                            kanalyzer_input_destpath))
+                num_sequences += len(batch)
+                batch = []
+                if len(pending) >= max_workers:
+                    # Refill as soon as any batch finishes rather than waiting on the oldest one
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+        if batch:
+            pending.add(executor.submit(writer, num_sequences + 1, batch,
+                                        kanalyzer_input_destpath))
+            num_sequences += len(batch)
+        for future in as_completed(pending):
+            future.result()
+    
+    print(f"Found {num_sequences} sequences to process")
+    
+    return num_sequences, sequences, duplicates
+
+def fast_copy(src, dst):
+    """Copy src to dst in the kernel with copy_file_range, falling back to shutil.copyfile"""
+    
+    copy_file_range = getattr(os, 'copy_file_range', None)  # Linux, Python 3.8+
+    if copy_file_range is not None:
+        try:
+            with open(src, 'rb') as s, open(dst, 'wb') as d:
+                remaining = os.fstat(s.fileno()).st_size
+                while remaining > 0:
+                    copied = copy_file_range(s.fileno(), d.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+                if remaining == 0:
+                    return
+        except OSError:
+            pass
+    shutil.copyfile(src, dst)
 
-def create_file_list(kanalyzer_input_destpath, feature_destpath, kanalyzer_destpath):
-    """Create list of sequence files for processing"""
+def create_file_list(kanalyzer_input_destpath, feature_destpath, kanalyzer_destpath, num_sequences):
+    """Create list of sequence files for processing
+    
+    The sequence files are numbered seq1.fasta .. seq{num_sequences}.fasta, so the list is
+    built from the count in numeric (input file) order rather than by scanning the directory.
+    """
     
-    files = sorted([f for f in os.listdir(kanalyzer_input_destpath) 
-                   if f.endswith('.fasta')])
+    files = [f"seq{i}.fasta" for i in range(1, num_sequences + 1)]
     
+    # One C-level join written through a buffer sized for the whole list
     list_file_path = os.path.join(kanalyzer_input_destpath, 'list.txt')
-    with open(list_file_path, 'w') as ff:
-        for f in files:
-            ff.write(f + '\n')
+    with open(list_file_path, 'w', buffering=LIST_BUFFER_SIZE) as ff:
+        if files:
+            ff.write('\n'.join(files))
+            ff.write('\n')
     
     # Copy list file to required locations
-    shutil.copy2(list_file_path, os.path.join(feature_destpath, 'list.txt'))
-    shutil.copy2(list_file_path, os.path.join(kanalyzer_destpath, 'list.txt'))
+    fast_copy(list_file_path, os.path.join(feature_destpath, 'list.txt'))
+    fast_copy(list_file_path, os.path.join(kanalyzer_destpath, 'list.txt'))
     
     return len(files)
 
-def parallel_feature_generation(curr_dir1, output_file, feature_dir):
-    """Run parallel k-mer feature generation"""
+def write_shard_lists(kanalyzer_destpath, num_shards, skip=()):
+    """Deal the entries of list.txt, minus those in skip, round-robin into num_shards shard list files"""
+    
+    with open(os.path.join(kanalyzer_destpath, 'list.txt'), 'r') as fp:
+        files = [f for f in fp.read().split() if f not in skip]
+    
+    num_shards = max(1, min(num_shards, len(files)))
+    shard_lists = []
+    for shard in range(num_shards):
+        shard_list = f"list_shard{shard}.txt"
+        with open(os.path.join(kanalyzer_destpath, shard_list), 'w', buffering=LIST_BUFFER_SIZE) as ff:
+            if files:
+                ff.write('\n'.join(files[shard::num_shards]))
+                ff.write('\n')
+        shard_lists.append(shard_list)
+    
+    return shard_lists
+
+def link_duplicate_counts(kanalyzer_output_destpath, duplicates):
+    """Give each duplicate sequence the kanalyzer count files of its canonical sequence"""
+    
+    for kmer_size in ['2mer', '3mer', '4mer']:
+        kmer_dir = os.path.join(kanalyzer_output_destpath, kmer_size)
+        for seq_id, canonical_id in duplicates.items():
+            src = os.path.join(kmer_dir, f"seq{canonical_id}.fasta.txt")
+            dst = os.path.join(kmer_dir, f"seq{seq_id}.fasta.txt")
+            try:
+                os.link(src, dst)
+            except OSError:
+                shutil.copyfile(src, dst)
+
+async def run_process(args, cwd):
+    """Run a command asynchronously and return its stdout, raising CalledProcessError on failure
+    
+    The command leads its own process group, so cancelling kills everything it started.
+    """
+    
+    proc = await asyncio.create_subprocess_exec(*args, cwd=cwd, stdout=asyncio.subprocess.PIPE,
+                                                stderr=asyncio.subprocess.PIPE, start_new_session=True)
+    try:
+        stdout, stderr = await proc.communicate()
+    except asyncio.CancelledError:
+        # Killing only the wrapper would leave its xargs/parallel and java children holding the pipes
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+        raise
+    
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, args, stdout.decode(), stderr.decode())
+    return stdout.decode()
+
+async def run_kmer_stage(parallel_script, shard_lists, kanalyzer_destpath, stale_sources, feature_destpath):
+    """Run every kanalyzer shard and the javac compilation (if any) concurrently
+    
+    Returns the shards' stdout. If any process fails the others are killed.
+    """
+    
+    tasks = [asyncio.ensure_future(run_process([parallel_script, shard_list, '1'], kanalyzer_destpath))
+             for shard_list in shard_lists]
+    if stale_sources:
+        tasks.append(asyncio.ensure_future(run_process(['javac'] + stale_sources, feature_destpath)))
+    
+    try:
+        outputs = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return outputs[:len(shard_lists)]
+
+def move_file(src, dst):
+    """Rename src to dst, copying across filesystems when a rename is not possible"""
+    
+    try:
+        os.replace(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+        os.remove(src)
+
+def stale_java_sources(source_dir, sources):
+    """Java sources whose .class file is missing or older than the source"""
+    
+    stale = []
+    for source in sources:
+        source_path = os.path.join(source_dir, source)
+        class_path = source_path[:-len('.java')] + '.class'
+        if not os.path.exists(class_path) or os.path.getmtime(class_path) < os.path.getmtime(source_path):
+            stale.append(source)
+    return stale
+
+def parallel_feature_generation(curr_dir1, output_file, feature_dir, max_jobs=None, duplicates=None):
+    """Run parallel k-mer feature generation
+    
+    Sequences listed in duplicates ({seq_id: canonical_seq_id}) are not run through
+    kanalyzer; they reuse the k-mer counts of their canonical sequence.
+    """
     
     feature_destpath = os.path.join(curr_dir1, feature_dir)
     kanalyzer_destpath = os.path.join(feature_destpath, "kanalyze-2.0.0", "code")
+    kanalyzer_output_destpath = os.path.join(feature_destpath, "kanalyze-2.0.0", "output_data")
+    duplicates = duplicates or {}
+    
+    if max_jobs is None:
+        max_jobs = os.cpu_count() * 4 // 5
+    
+    print(f"Starting parallel k-mer analysis with {os.cpu_count()} available cores")
     
-    print(f"Starting parallel k-mer analysis with {mp.cpu_count()} available cores")
+    # Make parallel script executable
+    parallel_script = "./runKanalyzer_parallel"
+    os.chmod(os.path.join(kanalyzer_destpath, parallel_script), 0o775)
     
-    # Change to kanalyzer directory
-    original_dir = os.getcwd()
-    os.chdir(kanalyzer_destpath)
+    # Java files are compiled alongside kanalyzer, only when the shipped classes are missing or out of date
+    stale_sources = stale_java_sources(feature_destpath, JAVA_SOURCES)
     
+    shard_lists = []
     try:
-        # Make parallel script executable
-        parallel_script = "./runKanalyzer_parallel"
-        subprocess.run(['chmod', '775', parallel_script], check=True)
-        
-        # Run parallel k-mer analysis
+        # Run parallel k-mer analysis, one kanalyzer worker per shard of the file list
         print("Running parallel k-mer feature extraction...")
         start_time = time.time()
-        result = subprocess.run([parallel_script], check=True, capture_output=True, text=True)
+        if duplicates:
+            print(f"Reusing k-mer counts for {len(duplicates)} duplicate sequences")
+        shard_lists = write_shard_lists(kanalyzer_destpath, max_jobs,
+                                        skip={f"seq{seq_id}.fasta" for seq_id in duplicates})
+        outputs = asyncio.run(run_kmer_stage(parallel_script, shard_lists, kanalyzer_destpath,
+                                             stale_sources, feature_destpath))
+        link_duplicate_counts(kanalyzer_output_destpath, duplicates)
         
         kmer_time = time.time() - start_time
-        print(f"K-mer extraction completed in {kmer_time:.2f} seconds")
+        print(f"K-mer extraction completed in {kmer_time:.2f} seconds using {len(shard_lists)} shards")
         
-        if result.stdout:
-            print("K-mer analysis output:", result.stdout)
+        stdout = ''.join(outputs)
+        if stdout:
+            print("K-mer analysis output:", stdout)
             
     except subprocess.CalledProcessError as e:
         print(f"Error running parallel k-mer analysis: {e}")
@@ -117,45 +478,66 @@ def parallel_feature_generation(curr_dir1, output_file, feature_dir):
             print("Error output:", e.stderr)
         raise
     finally:
-        os.chdir(original_dir)
-    
-    # Change to feature directory for Java compilation and execution
-    os.chdir(feature_destpath)
+        for shard_list in shard_lists:
+            os.remove(os.path.join(kanalyzer_destpath, shard_list))
     
     try:
-        print("Compiling and running parallel feature collector...")
+        print("Running parallel feature collector...")
         start_time = time.time()
         
-        # Compile Java files
-        subprocess.run(['javac', 'ParallelKmersFeaturesCollector.java'], check=True)
-        subprocess.run(['javac', 'BufferReaderAndWriter.java'], check=True)
-        
         # Run parallel feature collector
-        subprocess.run(['java', 'ParallelKmersFeaturesCollector'], check=True)
+        subprocess.run(['java', 'ParallelKmersFeaturesCollector'], cwd=feature_destpath, check=True)
         
         collection_time = time.time() - start_time
         print(f"Feature collection completed in {collection_time:.2f} seconds")
         
-        # Rename output file if needed
-        if output_file != "feature_file.csv":
-            subprocess.run(['mv', 'feature_file.csv', output_file], check=True)
-        
-        # Copy to data directory
-        curr_dir2 = os.getcwd()
-        data_dir = os.path.join(curr_dir1, 'data')
-        shutil.copy2(os.path.join(curr_dir2, output_file), 
-                     os.path.join(data_dir, output_file))
-        
-        # Clean up temporary file
-        os.remove(output_file)
+        # Move the feature file to the data directory under its final name
+        move_file(os.path.join(feature_destpath, 'feature_file.csv'),
+                  os.path.join(curr_dir1, 'data', output_file))
         
     except subprocess.CalledProcessError as e:
         print(f"Error in feature collection: {e}")
         raise
-    finally:
-        os.chdir(curr_dir1)
 
-def parallel_get_data(fasta_file, feature_dir, max_workers=None):
+def native_feature_generation(curr_dir1, output_file, sequences, max_jobs=None, duplicates=None):
+    """Count k-mer features in-process with numba and write the feature file to data/
+    
+    sequences holds the packed bases of the canonical sequences only, as returned by
+    parallel_sequence_splitting; the rows of the sequences in duplicates
+    ({seq_id: canonical_seq_id}) are copied from their canonical sequence.
+    """
+    
+    bases, offsets = sequences
+    duplicates = duplicates or {}
+    
+    # list.txt is in input order, so feature rows follow the sequences as parsed
+    print(f"Counting k-mers in-process for {len(offsets) - 1 + len(duplicates)} sequences...")
+    if duplicates:
+        print(f"Reusing k-mer counts for {len(duplicates)} duplicate sequences")
+    start_time = time.time()
+    
+    features = kmer_counts.count_features(bases, offsets, duplicates, max_jobs)
+    kmer_counts.write_feature_file(os.path.join(curr_dir1, 'data', output_file), features)
+    
+    kmer_time = time.time() - start_time
+    print(f"K-mer feature generation completed in {kmer_time:.2f} seconds")
+
+def load_kmer_counts():
+    """Import the numba k-mer counter into kmer_counts, returning False when numba is missing
+    
+    Deferred until the writer pool is shut down: pool workers import this module, and
+    numba would add a compiled kernel to each of them and make forking unsafe.
+    """
+    
+    global kmer_counts
+    try:
+        import kmer_counts
+    except ImportError:
+        return False
+    return True
+
+def parallel_get_data(fasta_file, feature_dir, max_workers=None, keep_sequences=False,
+                      find_duplicates=False, use_uring=False):
     """Process FASTA data with parallel sequence splitting"""
     
     curr_dir1 = os.getcwd()
@@ -169,14 +551,17 @@ def parallel_get_data(fasta_file, feature_dir, max_workers=None):
     setup_directories(feature_destpath, kanalyzer_input_destpath, kanalyzer_output_destpath)
     
     # Split sequences in parallel
-    num_sequences = parallel_sequence_splitting(fasta_file, data_filepath, 
-                                               kanalyzer_input_destpath, max_workers)
+    num_sequences, sequences, duplicates = parallel_sequence_splitting(fasta_file, data_filepath,
+                                                                       kanalyzer_input_destpath, max_workers,
+                                                                       keep_sequences,
+                                                                       find_duplicates, use_uring)
     
     # Create file list
-    num_files = create_file_list(kanalyzer_input_destpath, feature_destpath, kanalyzer_destpath)
+    num_files = create_file_list(kanalyzer_input_destpath, feature_destpath, kanalyzer_destpath,
+                                 num_sequences)
     
     print(f"Successfully prepared {num_files} sequence files for parallel processing")
-    return num_files
+    return num_files, sequences, duplicates
 
 def main():
     """Main function with optimized parallel processing"""
@@ -189,16 +574,22 @@ def main():
     parser.add_option("-d", "--featuredir", dest="feature_dir", 
                      help="Feature directory.", default="features")
     parser.add_option("-j", "--jobs", dest="max_jobs", type="int",
-                     help=f"Maximum number of parallel jobs (default: {mp.cpu_count() * 4 // 5})",
-                     default=mp.cpu_count() * 4 // 5)
+                     help=f"Maximum number of parallel jobs (default: {os.cpu_count() * 4 // 5})",
+                     default=os.cpu_count() * 4 // 5)
+    parser.add_option("-u", "--io-uring", dest="io_uring", action="store_true", default=False,
+                     help="Write sequence files through batched io_uring submissions (needs liburing)")
     
     (options, args) = parser.parse_args()
     
     if not options.filename:
         parser.error("FASTA filename is required. Use -f option.")
     
+    if options.io_uring and not uring_available():
+        print("io_uring is not available (liburing missing or blocked by the kernel), using plain writes")
+        options.io_uring = False
+    
     print(f"ClassifyTE Parallel Feature Generator")
-    print(f"Available CPU cores: {mp.cpu_count()}")
+    print(f"Available CPU cores: {os.cpu_count()}")
     print(f"Using parallel jobs: {options.max_jobs}")
     print(f"Processing: {options.filename}")
     print(f"Output: {options.output_filename}")
@@ -216,12 +607,23 @@ def main():
     
     start_time = time.time()
     
-    # Process data with parallel splitting
-    num_sequences = parallel_get_data(options.filename, feature_dir, 
-                                     max_workers=min(32, options.max_jobs))
-    
-    # Generate features in parallel
-    parallel_feature_generation(curr_dir1, options.output_filename, feature_dir)
+    # The sequences are only kept when they will be counted in-process; numba itself is imported afterwards
+    use_numba = importlib.util.find_spec('numba') is not None
+    
+    # Process data with parallel splitting; the writer pool is shut down when it returns
+    num_sequences, sequences, duplicates = parallel_get_data(options.filename, feature_dir,
+                                                            max_workers=min(WRITE_WORKERS, options.max_jobs),
+                                                            keep_sequences=use_numba,
+                                                            find_duplicates=True,
+                                                            use_uring=options.io_uring)
+    
+    # Generate features in parallel, falling back to kanalyzer + Java without numba
+    if use_numba and load_kmer_counts():
+        native_feature_generation(curr_dir1, options.output_filename, sequences, options.max_jobs,
+                                  duplicates)
+    else:
+        parallel_feature_generation(curr_dir1, options.output_filename, feature_dir,
+                                    options.max_jobs, duplicates)
     
     total_time = time.time() - start_time
     
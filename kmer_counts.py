@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+In-process k-mer counting for ClassifyTE
+Numba replacement for the kanalyzer + Java feature collector chain
+
+License: MIT
+"""
+
+import numpy as np
+import numba
+from numba import njit, prange
+
+KMER_SIZES = (2, 3, 4)
+
+# Same nucleotide order as the Java feature collectors, so column i of the
+# count matrix lines up with column i of the kanalyzer based feature file
+NUCLEOTIDES = "ACTG"
+
+# Base -> 2-bit code; everything that is not A/C/T/G (N, IUPAC codes, ...) breaks the k-mer
+BASE_LUT = np.full(256, 255, dtype=np.uint8)
+for code, base in enumerate(NUCLEOTIDES):
+    BASE_LUT[ord(base)] = code
+    BASE_LUT[ord(base.lower())] = code
+
+
+def kmer_names(k):
+    """All k-mers of length k in feature column order"""
+
+    names = [""]
+    for _ in range(k):
+        names = [name + base for name in names for base in NUCLEOTIDES]
+    return names
+
+
+FEATURE_HEADER = ",".join(name for k in KMER_SIZES for name in kmer_names(k))
+
+# Column where the block of each k-mer size starts in the feature matrix
+KMER_ARRAY = np.array(KMER_SIZES, dtype=np.int64)
+COLUMN_OFFSETS = np.cumsum([0] + [4 ** k for k in KMER_SIZES[:-1]]).astype(np.int64)
+NUM_FEATURES = sum(4 ** k for k in KMER_SIZES)
+
+
+@njit("void(uint8[:], int64[:], uint8[:], int64[:], int64[:], int32[:, :])", parallel=True, cache=True)
+def count_kmers(data, offsets, lut, ks, columns, out):
+    """Count every k-mer size of sequence data[offsets[i]:offsets[i + 1]] into row out[i]
+
+    A single rolling index over the longest k serves all sizes: the k-mer ending at
+    the current base is the low 2 * k bits of the index.
+    """
+
+    mask = (1 << (2 * ks.max())) - 1
+    for i in prange(offsets.shape[0] - 1):
+        idx = 0
+        valid = 0
+        for pos in range(offsets[i], offsets[i + 1]):
+            base = lut[data[pos]]
+            if base == 255:
+                valid = 0
+                continue
+            idx = ((idx << 2) | base) & mask
+            valid += 1
+            for j in range(ks.shape[0]):
+                k = ks[j]
+                if valid >= k:
+                    out[i, columns[j] + (idx & ((1 << (2 * k)) - 1))] += 1
+
+
+def count_features(bases, offsets, duplicates=None, num_threads=None):
+    """Build the 2/3/4-mer feature matrix for a FASTA file
+
+    bases holds its distinct sequences back to back in file order, sequence i being
+    bases[offsets[i]:offsets[i + 1]]; both are wrapped without copying when they are a
+    bytearray and an int64 array.array. duplicates maps each repeated sequence's 1-based
+    id to the id of its first occurrence, whose row it reuses.
+    """
+
+    if num_threads is not None:
+        numba.set_num_threads(max(1, min(num_threads, numba.config.NUMBA_NUM_THREADS)))
+
+    data = np.frombuffer(bases, dtype=np.uint8)
+    offsets = np.frombuffer(offsets, dtype=np.int64)
+    num_distinct = offsets.shape[0] - 1
+    features = np.zeros((num_distinct, NUM_FEATURES), dtype=np.int32)
+    count_kmers(data, offsets, BASE_LUT, KMER_ARRAY, COLUMN_OFFSETS, features)
+    if not duplicates:
+        return features
+
+    # Row of the feature matrix for every sequence; a canonical sequence is never itself a
+    # duplicate, so duplicates can be resolved after the distinct rows are numbered
+    duplicate_ids = np.fromiter(duplicates.keys(), dtype=np.int64, count=len(duplicates)) - 1
+    canonical_ids = np.fromiter(duplicates.values(), dtype=np.int64, count=len(duplicates)) - 1
+    is_distinct = np.ones(num_distinct + len(duplicates), dtype=np.bool_)
+    is_distinct[duplicate_ids] = False
+    rows = np.cumsum(is_distinct) - 1
+    rows[duplicate_ids] = rows[canonical_ids]
+    return features[rows]
+
+
+def write_feature_file(path, features):
+    """Write the feature matrix in the same CSV layout as the Java feature collectors"""
+
+    np.savetxt(path, features, fmt="%d", delimiter=",", header=FEATURE_HEADER, comments="")